@@ -2,6 +2,10 @@ import streamlit as st
 from datetime import datetime
 import pickle
 import pandas as pd
+import matplotlib.pyplot as plt
+
+from horizons import predict_mortality
+from sensitivity import LACTATE_GRID, UREA_GRID, RiskSurface
 
 # Page config
 st.set_page_config(
@@ -26,6 +30,11 @@ def load_model():
 # Loading the model
 package = load_model()
 
+# Risk surface per model version (keeps its own cache of computed surfaces)
+@st.cache_resource
+def load_risk_surface(version):
+    return RiskSurface(package)
+
 # CSS
 st.markdown("""
 <style>
@@ -566,6 +575,8 @@ elif current_page_clean == 'Test the model':
     Use this interactive tool to predict mortality risk for ER patients based on the top 5 clinical features 
     identified by our Random Forest model. Enter the patient's values below and click "Predict Mortality Risk" 
     to see the prediction.
+    Lab values that are not available yet (for example lactate not yet drawn) can be left blank; 
+    they are estimated from the values that were entered.
     </div>
     """, unsafe_allow_html=True)
     
@@ -576,7 +587,8 @@ elif current_page_clean == 'Test the model':
             "Lactate (ABG)", 
             min_value=0.2, 
             max_value=15.0, 
-            value=2.0, 
+            value=None, 
+            placeholder="Not available",
             step=0.1,
             help="Normal range: 0.5-2.2 mmol/L"
         )
@@ -584,7 +596,8 @@ elif current_page_clean == 'Test the model':
             "Urea (mg/dl)", 
             min_value=2.0, 
             max_value=450.0, 
-            value=20.0, 
+            value=None, 
+            placeholder="Not available",
             step=1.0,
             help="Normal range: 7-20 mg/dL"
         )
@@ -594,7 +607,8 @@ elif current_page_clean == 'Test the model':
             "Creatinine (mg/dl)", 
             min_value=0.3, 
             max_value=16.0, 
-            value=1.0, 
+            value=None, 
+            placeholder="Not available",
             step=0.1,
             help="Normal range: 0.6-1.2 mg/dL"
         )
@@ -602,7 +616,8 @@ elif current_page_clean == 'Test the model':
             "Platelets (10⁶/µL)", 
             min_value=5.0, 
             max_value=800.0, 
-            value=250.0, 
+            value=None, 
+            placeholder="Not available",
             step=1.0,
             help="Normal range: 150-450 ×10³/µL"
         )
@@ -635,7 +650,7 @@ elif current_page_clean == 'Test the model':
     # Running model inference based on user inputs
     if predict_button and package:
         try:
-            # Creating input dataframe
+            # Creating input dataframe (blank inputs become NaN)
             input_df = pd.DataFrame({
                 "Lactate (in ABG)": [lactate],
                 "Urea (mg/dl)": [urea],
@@ -643,12 +658,22 @@ elif current_page_clean == 'Test the model':
                 "Platelets (10 ^ 6)": [platelets],
                 "Resuscitation Received": [resus_value]
             })
+            missing_inputs = [col for col in input_df.columns if input_df[col].isna().all()]
+            input_df[missing_inputs] = input_df[missing_inputs].astype(float)
             
-            model = package["model"]
-            threshold = package["threshold"]
+            # Imputing blank labs from the entered ones with the packaged multivariate imputer
+            # (single patient: one precomputed linear form on the fitted-order vector)
+            if "imputer" in package and missing_inputs:
+                imputer = package["imputer"]
+                entered = input_df.iloc[0].to_dict()
+                filled = imputer.impute_row([entered.get(col) for col in imputer.columns_])
+                for col in missing_inputs:
+                    if col in imputer.columns_:
+                        input_df[col] = filled[imputer.columns_.index(col)]
             
-            # Getting prediction
-            proba = model.predict_proba(input_df)[:, 1][0]
+            # Getting prediction (with a packaged horizon model, one forest gives every horizon)
+            proba, threshold, horizon_proba = predict_mortality(package, input_df)
+            proba = proba[0]
             prediction = int(proba >= threshold)
             
             # Displaying results
@@ -684,28 +709,57 @@ elif current_page_clean == 'Test the model':
                 </div>
                 """, unsafe_allow_html=True)
             
+            if missing_inputs:
+                if "imputer" in package:
+                    imputed = ", ".join(f"{col} ≈ {input_df[col].iloc[0]:.1f}" for col in missing_inputs)
+                    st.info(f"Not entered, estimated from the other values: {imputed}")
+                else:
+                    st.info(f"Not entered, filled with the training median: {', '.join(missing_inputs)}")
+            
             # Interpretation
             st.markdown("---")
             if prediction:
-                st.error("""
+                st.error(f"""
                 **🚨 HIGH RISK ALERT**
                 
-                This patient has a mortality probability above the optimized threshold of 0.612. 
+                This patient has a mortality probability above the optimized threshold of {threshold:.3f}. 
                 Consider immediate intervention and close monitoring. The model has identified 
                 this patient as high-risk based on the entered clinical parameters.
                 """)
             else:
-                st.success("""
+                st.success(f"""
                 **✅ LOW RISK**
                 
-                This patient has a mortality probability below the optimized threshold of 0.612. 
+                This patient has a mortality probability below the optimized threshold of {threshold:.3f}. 
                 Continue with standard care protocols while maintaining appropriate monitoring.
                 """)
             
+            # Earlier horizons from the same forest pass (In-hospital is the main result above)
+            if horizon_proba is not None:
+                horizon_proba = horizon_proba.iloc[0]
+                horizon_thresholds = {
+                    name: threshold_h for name, threshold_h in package["horizons"]["thresholds"].items()
+                    if name != "In-hospital"
+                }
+                
+                st.markdown('<h3 style="text-align: center;">Mortality by Horizon</h3>', unsafe_allow_html=True)
+                for col, (name, threshold_h) in zip(st.columns(len(horizon_thresholds)), horizon_thresholds.items()):
+                    with col:
+                        high = horizon_proba[name] >= threshold_h
+                        st.markdown(f"""
+                        <div class="metric-card">
+                            <div class="metric-value {'risk-high' if high else 'risk-low'}">{horizon_proba[name]:.3f}</div>
+                            <div class="metric-label">{name} Mortality (threshold {threshold_h:.3f})</div>
+                        </div>
+                        """, unsafe_allow_html=True)
+                st.markdown("---")
+            
             # Model metrics expander
             with st.expander("View Model Performance Metrics"):
-                if "metrics" in package:
-                    metrics = package["metrics"]
+                # Metrics of the model that produced the result above
+                source = package["horizons"] if "horizons" in package else package
+                if "metrics" in source:
+                    metrics = source["metrics"]
                     
                     col1, col2 = st.columns(2)
                     with col1:
@@ -715,6 +769,9 @@ elif current_page_clean == 'Test the model':
                     with col2:
                         st.metric("Recall", f"{metrics.get('Recall', 0):.3f}")
                     
+                    if "version" in package:
+                        st.caption(f"Model version {package['version']} (updated {package.get('updated_on', 'n/a')})")
+                    
                     if "classification_report" in metrics:
                         st.subheader("Classification Report")
                         st.text(metrics["classification_report"])
@@ -776,6 +833,58 @@ elif current_page_clean == 'Test the model':
 
 
         
+    
+    # What-if sensitivity view
+    if package and st.toggle("Show what-if risk surface (Lactate × Urea)"):
+        st.markdown("---")
+        st.markdown('<h3 style="text-align: center;">What-if: Lactate × Urea</h3>', unsafe_allow_html=True)
+        st.caption("Mortality probability across the full lactate and urea ranges, with creatinine, platelets and "
+                   "resuscitation fixed at the values entered above. The red line is the decision threshold.")
+        
+        try:
+            surface_model = load_risk_surface(package.get("version", 1))
+            surface = surface_model.compute({
+                "Creatinine (mg/dl)": creatinine,
+                "Platelets (10 ^ 6)": platelets,
+                "Resuscitation Received": resus_value
+            })
+            
+            # Heatmap with the threshold contour and the current patient
+            fig, ax = plt.subplots(figsize=(8, 5))
+            heatmap = ax.imshow(
+                surface,
+                origin="lower",
+                aspect="auto",
+                extent=[LACTATE_GRID[0], LACTATE_GRID[-1], UREA_GRID[0], UREA_GRID[-1]],
+                cmap="Blues",
+                vmin=0,
+                vmax=1
+            )
+            if surface.min() < surface_model.threshold < surface.max():
+                ax.contour(LACTATE_GRID, UREA_GRID, surface, levels=[surface_model.threshold], colors="#c0392b", linewidths=2)
+            if lactate is not None and urea is not None:
+                ax.scatter([lactate], [urea], marker="x", s=80, color="black", label="Current patient")
+                ax.legend(loc="upper right")
+            ax.set_xlabel("Lactate (ABG)")
+            ax.set_ylabel("Urea (mg/dl)")
+            fig.colorbar(heatmap, ax=ax, label="Mortality probability")
+            st.pyplot(fig)
+            plt.close(fig)
+            
+            # Risk curve over lactate at the entered urea
+            if urea is not None:
+                row = abs(UREA_GRID - urea).argmin()
+                st.markdown(f"**Risk as lactate changes (urea = {UREA_GRID[row]:.0f} mg/dl)**")
+                st.line_chart(pd.DataFrame({
+                    "Mortality probability": surface[row],
+                    "Decision threshold": surface_model.threshold
+                }, index=pd.Index(LACTATE_GRID, name="Lactate (ABG)")))
+        
+        except Exception as e:
+            st.error(f"Error computing risk surface: {str(e)}")
+
+
+        
 
 
 
@@ -0,0 +1,103 @@
+import argparse
+import pickle
+
+import numpy as np
+import pandas as pd
+from sklearn.metrics import precision_recall_curve
+
+# Cumulative mortality horizons built from the raw 'Mortality' categories
+HORIZONS = {
+    'ED': ['Ed Mortality'],
+    '7-day': ['Ed Mortality', 'Within 7 Days Mortality'],
+    'In-hospital': ['Ed Mortality', 'Within 7 Days Mortality', 'In-Hospital Mortality (>7 Days)'],
+}
+
+
+def threshold_for_recall(y_true, y_proba, target_recall=0.8):
+    """Picks the threshold whose recall is closest to target_recall (same rule as the notebook)."""
+    precision, recall, thresholds = precision_recall_curve(y_true, y_proba)
+    idx = np.abs(recall[:-1] - target_recall).argmin()
+    return float(thresholds[idx])
+
+
+def horizon_targets(mortality):
+    """Turns the raw 'Mortality' column into one 0/1 column per horizon (1 = death).
+
+    Missing values count as Alive, as in the notebook; 'In-hospital' equals the binary target.
+    """
+    mortality = pd.Series(mortality).astype(str).str.strip()
+    return pd.DataFrame(
+        {name: mortality.isin(categories).astype(int) for name, categories in HORIZONS.items()},
+        index=mortality.index
+    )
+
+
+def predict_horizons(model, X):
+    """Returns one death probability column per horizon from a multi-output forest pipeline.
+
+    A multi-output tree stores every horizon in the same leaf, so each tree is traversed
+    once per patient regardless of the number of horizons.
+    """
+    proba = model.predict_proba(X)
+    forest = model.steps[-1][1]
+    P = np.column_stack([p[:, list(classes).index(1)] for p, classes in zip(proba, forest.classes_)])
+
+    # Horizons are nested, so risk can only grow from ED to in-hospital
+    P = np.maximum.accumulate(P, axis=1)
+    return pd.DataFrame(P, columns=list(HORIZONS), index=getattr(X, 'index', None))
+
+
+def horizon_thresholds(Y, P, target_recall=0.8):
+    """Chooses a threshold per horizon with the notebook's recall-target rule."""
+    return {name: threshold_for_recall(Y[name], P[name], target_recall) for name in HORIZONS}
+
+
+def predict_mortality(package, X):
+    """Returns (death probability, threshold, horizon probabilities or None) for imputed rows.
+
+    When a horizon model is packaged, its 'In-hospital' output (the same target as the
+    main model) and threshold are the main result, so one forest gives every horizon.
+    Otherwise the main model is used.
+    """
+    if "horizons" in package:
+        P = predict_horizons(package['horizons']['model'], X)
+        return P['In-hospital'].to_numpy(), package['horizons']['thresholds']['In-hospital'], P
+    return package['model'].predict_proba(X)[:, 1], package['threshold'], None
+
+
+def score_batch(package, X):
+    """Scores a batch of patients with one forest: the main result and, if packaged, every horizon."""
+    if "imputer" in package:
+        X = package["imputer"].transform(X)
+
+    proba, threshold, P = predict_mortality(package, X)
+    scores = pd.DataFrame(index=X.index)
+    scores['Probability'] = proba
+    scores['High Risk'] = (proba >= threshold).astype(int)
+
+    if P is not None:
+        for name, threshold_h in package['horizons']['thresholds'].items():
+            scores[f"{name} Probability"] = P[name]
+            scores[f"{name} High Risk"] = (P[name] >= threshold_h).astype(int)
+    return scores
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Batch scoring of ED patients with the deployment package")
+    parser.add_argument('input_csv')
+    parser.add_argument('output_csv')
+    parser.add_argument('--model', default='streamlit_app/rf_mortality_model.pickle')
+    args = parser.parse_args()
+
+    with open(args.model, 'rb') as f:
+        package = pickle.load(f)
+    patients = pd.read_csv(args.input_csv, encoding='latin-1')
+
+    # Cleaning lab columns as in the notebook (thousands separators, 0 -> NaN)
+    X = patients[package['features']].copy()
+    for col in X.columns.drop('Resuscitation Received', errors='ignore'):
+        X[col] = pd.to_numeric(X[col].astype(str).str.replace(',', '', regex=False), errors='coerce')
+        X[col] = X[col].replace(0, np.nan)
+
+    scores = score_batch(package, X)
+    pd.concat([patients, scores], axis=1).to_csv(args.output_csv, index=False)
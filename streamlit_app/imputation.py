@@ -0,0 +1,216 @@
+import warnings
+
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from sklearn.base import BaseEstimator, TransformerMixin
+from sklearn.exceptions import ConvergenceWarning
+
+# Lab and vital columns where the notebook maps 0 to NaN
+NUMERIC_COLUMNS = [
+    'Age (in years)', 'Gender', 'Respiratory Rate (per minute)',
+    'Is Intubated', 'Systole BP (mmgh)', 'Dystole BP (mmgh)',
+    'Pulse (bpm)', 'Temperature (F)', 'Saturations',
+    'Oxygen Saturation', 'GCS', 'Duration', 'Duration.1',
+    'Hemoglobin (gm/dl)', 'Totalcount(10^3)', 'Neutrophil',
+    'Lymphocyte', 'Platelets (10 ^ 6)', 'Urea (mg/dl)',
+    'Creatinine (mg/dl)', 'Sodium (mmol/l)', 'Potassium (mmol/l)',
+    'SGOT (IU/L)', 'SGPT (IU/L)', 'CRP (mg/l)', 'ALP (u/L)',
+    'Total bilirubin (mg/dl)', 'Direct bilirubin (mg/dl)',
+    'PT', 'INR', 'Lactate', 'CK-MB', 'Troponin', 'Lipase (u/L)',
+    'pH (in ABG)', 'pCO2 (in ABG)', 'po2 (in ABG)',
+    'HCO3 (in ABG)', 'Lactate (in ABG)', 'Anion Gap (in ABG)'
+]
+
+# Binary codes among the numeric columns; they are not imputed as continuous values
+CODE_COLUMNS = ['Gender', 'Is Intubated', 'Oxygen Saturation']
+
+# Lab and vital columns filled by the imputer
+IMPUTED_COLUMNS = [c for c in NUMERIC_COLUMNS if c not in CODE_COLUMNS]
+
+# Smallest value allowed before taking logs of a strictly positive column
+_LOG_FLOOR = 1e-6
+
+
+def _pattern_codes(missing):
+    # Packing each row's missingness mask into 64-bit words so patterns group with a fast unique
+    packed = np.packbits(missing, axis=1, bitorder='little')
+    packed = np.pad(packed, ((0, 0), (0, -packed.shape[1] % 8)))
+    codes = np.ascontiguousarray(packed).view('<u8')
+    return codes.ravel() if codes.shape[1] == 1 else codes
+
+
+def _design(Z, j):
+    # Intercept plus every column except j
+    return np.hstack([np.ones((Z.shape[0], 1)), np.delete(Z, j, axis=1)])
+
+
+def _fit_column(Z, missing, j, alpha):
+    # Ridge regression coefficients of column j on all other columns, using rows where j is observed
+    observed = ~missing[:, j]
+    A = _design(Z, j)
+    penalty = alpha * np.eye(A.shape[1])
+    penalty[0, 0] = 0.0
+    A_obs = A[observed]
+    w = np.linalg.solve(A_obs.T @ A_obs + penalty, A_obs.T @ Z[observed, j])
+    return j, w
+
+
+class ChainedRegressionImputer(BaseEstimator, TransformerMixin):
+    """Multivariate (MICE-style) imputer with a precomputed linear form for fast inference.
+
+    Fitting runs chained ridge regressions, one column per job, then fills the columns
+    one after another so each fill sees the previous ones, until the filled values
+    settle (a ConvergenceWarning is raised if they do not within max_iter rounds). The
+    completed data are summarised as a mean vector and covariance matrix. By default
+    columns whose observed values are all positive are modelled in log space; columns
+    that can be zero or negative (e.g. anion gap) stay on their own scale. At inference
+    the missing values of a row are its conditional mean given the observed ones,
+    x_m = b + B @ x_o, where b and B are computed once per missingness pattern and cached.
+    """
+
+    def __init__(self, columns=None, max_iter=10, tol=1e-3, alpha=1.0, log_transform=True, n_jobs=-1):
+        self.columns = columns
+        self.max_iter = max_iter
+        self.tol = tol
+        self.alpha = alpha
+        self.log_transform = log_transform
+        self.n_jobs = n_jobs
+
+    def _to_matrix(self, X, columns):
+        # Aligning to the fitted columns; columns absent from X are treated as missing
+        if isinstance(X, pd.DataFrame):
+            X = X.reindex(columns=columns)
+            Z = X.apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float)
+        else:
+            Z = np.array(X, dtype=float, ndmin=2)
+        return Z
+
+    def _log(self, Z, log_columns):
+        # Moving strictly positive columns to log space (in place)
+        Z[..., log_columns] = np.log(np.maximum(Z[..., log_columns], _LOG_FLOOR))
+        return Z
+
+    def _exp(self, Z, log_columns):
+        Z[..., log_columns] = np.exp(Z[..., log_columns])
+        return Z
+
+    def fit(self, X, y=None):
+        if self.columns is not None:
+            columns = list(self.columns)
+        elif isinstance(X, pd.DataFrame):
+            columns = list(X.columns)
+        else:
+            columns = list(range(np.shape(X)[1]))
+
+        Z = self._to_matrix(X, columns)
+        missing = np.isnan(Z)
+        n_observed = (~missing).sum(axis=0)
+        if (n_observed < 2).any():
+            empty = [c for c, n in zip(columns, n_observed) if n < 2]
+            raise ValueError(f"Columns need at least two observed values to be imputed: {empty}")
+
+        # Only columns that are positive wherever observed are logged
+        if self.log_transform:
+            self.log_columns_ = ~np.any(Z <= 0, axis=0)
+        else:
+            self.log_columns_ = np.zeros(len(columns), dtype=bool)
+        Z = self._log(Z, self.log_columns_)
+
+        # Starting from column means, then refining with chained regressions
+        Z_filled = np.where(missing, np.nanmean(Z, axis=0), Z)
+        scale = np.nanstd(Z, axis=0)
+        scale[scale == 0] = 1.0
+        to_impute = np.flatnonzero(missing.any(axis=0))
+
+        self.n_iter_ = 0
+        with Parallel(n_jobs=self.n_jobs, prefer='threads') as parallel:
+            for _ in range(self.max_iter):
+                # Each column is regressed on the previous round's values, so columns fit in parallel
+                results = parallel(delayed(_fit_column)(Z_filled, missing, j, self.alpha) for j in to_impute)
+                # Filling in sequence: updating every column at once from the old values can diverge
+                updated = Z_filled.copy()
+                for j, w in results:
+                    rows = missing[:, j]
+                    updated[rows, j] = _design(updated[rows], j) @ w
+                change = np.max(np.abs(updated - Z_filled) / scale) if len(to_impute) else 0.0
+                Z_filled = updated
+                self.n_iter_ += 1
+                if change < self.tol:
+                    break
+            else:
+                warnings.warn(
+                    f"Chained regressions did not converge after {self.max_iter} iterations "
+                    f"(last change {change:.2g}, tol {self.tol:g}); consider raising max_iter.",
+                    ConvergenceWarning
+                )
+
+        self.columns_ = columns
+        self.mean_ = Z_filled.mean(axis=0)
+        self.covariance_ = np.cov(Z_filled, rowvar=False) + self.alpha * 1e-3 * np.eye(len(columns))
+        self._patterns = {}
+        return self
+
+    def _pattern(self, missing):
+        # Computing (and caching) the regression form for one missingness pattern
+        key = missing.tobytes()
+        form = self._patterns.get(key)
+        if form is None:
+            m = np.flatnonzero(missing)
+            o = np.flatnonzero(~missing)
+            if len(o):
+                coef = np.linalg.solve(self.covariance_[np.ix_(o, o)], self.covariance_[np.ix_(o, m)]).T
+            else:
+                coef = np.zeros((len(m), 0))
+            intercept = self.mean_[m] - coef @ self.mean_[o]
+            form = (m, o, intercept, coef, self.log_columns_[o], self.log_columns_[m])
+            self._patterns[key] = form
+        return form
+
+    def precompute(self, observed_columns):
+        """Caches the regression form for every subset of observed_columns (all other columns missing)."""
+        index = [self.columns_.index(c) for c in observed_columns]
+        for bits in range(2 ** len(index)):
+            missing = np.ones(len(self.columns_), dtype=bool)
+            for k, i in enumerate(index):
+                if bits >> k & 1:
+                    missing[i] = False
+            self._pattern(missing)
+        return self
+
+    def impute_row(self, values):
+        """Imputes one patient given values in fitted column order (NaN where missing)."""
+        x = np.array(values, dtype=float)
+        missing = np.isnan(x)
+        if not missing.any():
+            return x
+        m, o, intercept, coef, log_o, log_m = self._pattern(missing)
+        z = intercept + coef @ self._log(x[o], log_o)
+        x[m] = self._exp(z, log_m)
+        return x
+
+    def transform(self, X):
+        Z = self._log(self._to_matrix(X, self.columns_), self.log_columns_)
+        missing = np.isnan(Z)
+
+        # Imputing all rows that share a missingness pattern in one matrix product
+        if missing.any():
+            codes, inverse = np.unique(_pattern_codes(missing), axis=0, return_inverse=True)
+            for k in range(len(codes)):
+                rows = np.flatnonzero(inverse.ravel() == k)
+                pattern = missing[rows[0]]
+                if not pattern.any():
+                    continue
+                m, o, intercept, coef, _, _ = self._pattern(pattern)
+                Z[np.ix_(rows, m)] = intercept + Z[np.ix_(rows, o)] @ coef.T
+
+        Z = self._exp(Z, self.log_columns_)
+
+        if not isinstance(X, pd.DataFrame):
+            return np.where(missing, Z, X)
+        # Filling only the missing entries of fitted columns present in X; other columns pass through
+        out = X.copy()
+        for i, col in enumerate(self.columns_):
+            if col in out.columns:
+                out[col] = pd.to_numeric(out[col], errors='coerce').where(~missing[:, i], Z[:, i])
+        return out
@@ -0,0 +1,211 @@
+import copy
+import json
+import os
+import pickle
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from sklearn.metrics import confusion_matrix, f1_score, precision_score, recall_score, roc_auc_score
+from sklearn.model_selection import train_test_split
+from sklearn.utils.class_weight import compute_class_weight
+
+from horizons import HORIZONS, predict_mortality, threshold_for_recall
+
+
+def _model_input(package, X):
+    # Applying the packaged imputer (if any) exactly as the app does before predicting
+    if "imputer" in package:
+        return package["imputer"].transform(X)
+    return X
+
+
+def evaluate(y_true, y_proba, threshold):
+    """Returns the metrics dictionary stored in the deployment package."""
+    y_pred = (y_proba >= threshold).astype(int)
+    return {
+        'ROC-AUC': roc_auc_score(y_true, y_proba),
+        'F1': f1_score(y_true, y_pred),
+        'Precision': precision_score(y_true, y_pred, zero_division=0),
+        'Recall': recall_score(y_true, y_pred),
+        'Confusion_Matrix': confusion_matrix(y_true, y_pred).tolist()
+    }
+
+
+def _tree_proba(tree, Xt, pos):
+    # Death probability from one tree, one column per output
+    proba = tree.predict_proba(Xt)
+    if len(pos) == 1:
+        return proba[:, pos[0]][:, None]
+    return np.column_stack([p[:, i] for p, i in zip(proba, pos)])
+
+
+def update_forest(package, X_recent, y_recent, n_new_trees=100, max_trees=None, retire='weakest',
+                  target_recall=0.8, eval_fraction=0.5):
+    """Grows the Random Forest the app serves with trees fitted on recent patients.
+
+    The existing trees are kept and n_new_trees are added with warm_start on X_recent.
+    The forest is then cut back to max_trees (default: its previous size) by retiring
+    either the 'oldest' trees or the 'weakest' ones, ranked by Brier score on the recent
+    patients each tree did not see. The threshold is re-chosen on the updated forest's
+    out-of-bag predictions.
+
+    Without a horizon model the main model is grown and y_recent is coded 1 = death, as
+    in the notebook. With one, the app serves the horizon model, so that forest is grown
+    instead: y_recent must then hold one 0/1 column per horizon (horizon_targets of the
+    raw 'Mortality' column), Brier scores are averaged over the horizons and every
+    horizon gets a new threshold. The main model is left unchanged.
+
+    With 'weakest', the recent patients are split (stratified, eval_fraction held out):
+    trees are ranked on one part, and the threshold and the 'updated' metrics use only
+    the other, so tree selection does not inflate the reported performance.
+
+    Returns the new deployment package and a comparison report against the old one.
+    """
+    if retire not in ('weakest', 'oldest'):
+        raise ValueError("retire must be 'weakest' or 'oldest'")
+
+    horizons = package.get('horizons')
+    if horizons is not None:
+        names = list(horizons.get('names', HORIZONS))
+        if not isinstance(y_recent, pd.DataFrame) or not set(names) <= set(y_recent.columns):
+            raise ValueError(f"The package has a horizon model: y_recent needs one 0/1 column per horizon {names}")
+        Y = y_recent[names].to_numpy().astype(int)
+        model = copy.deepcopy(horizons['model'])
+    else:
+        Y = np.asarray(y_recent).astype(int).reshape(-1, 1)
+        model = copy.deepcopy(package['model'])
+    forest = model.steps[-1][1]
+    classes = forest.classes_ if forest.n_outputs_ > 1 else [forest.classes_]
+    if any(set(np.unique(Y[:, k])) != set(c) for k, c in enumerate(classes)):
+        raise ValueError("Recent batch must contain both outcome classes (for every horizon)")
+    if not forest.bootstrap:
+        raise ValueError("update_forest needs a bootstrapped forest: tree ranking and the threshold use out-of-bag rows")
+
+    X = _model_input(package, X_recent)
+    Xt = model[:-1].transform(X)
+    y_fit = Y if horizons is not None else Y[:, 0]
+    n_old = len(forest.estimators_)
+    max_trees = max_trees or n_old
+    version = package.get('version', 1)
+    batches = list((horizons or package).get('tree_batches', [version] * n_old))
+
+    # Fitting only the new trees on the recent data; existing trees are left untouched.
+    # 'balanced' weights are spelled out from the recent batch, as scikit-learn advises for warm_start
+    class_weight, random_state = forest.class_weight, forest.random_state
+    if class_weight == 'balanced':
+        weights = [dict(zip(c, compute_class_weight('balanced', classes=c, y=Y[:, k]))) for k, c in enumerate(classes)]
+        forest.set_params(class_weight=weights if horizons is not None else weights[0])
+    # warm_start skips the first n_old seeds of random_state, so without reseeding every
+    # update cut back to the same size would give its new trees the same seeds as the last one
+    if random_state is not None:
+        base = int(random_state) if isinstance(random_state, (int, np.integer)) else 0
+        forest.set_params(random_state=int(np.random.SeedSequence([base, version + 1]).generate_state(1)[0]))
+    forest.set_params(warm_start=True, n_estimators=n_old + n_new_trees)
+    forest.fit(Xt, y_fit)
+    in_bag = forest.estimators_samples_[n_old:]
+    forest.set_params(warm_start=False, class_weight=class_weight, random_state=random_state)
+    batches += [version + 1] * n_new_trees
+
+    # Per-tree out-of-bag masks: old trees never saw the recent patients
+    n = len(Y)
+    oob = np.ones((len(forest.estimators_), n), dtype=bool)
+    for i, samples in enumerate(in_bag, start=n_old):
+        oob[i, samples] = False
+
+    # Rows used to rank trees and rows used to choose the threshold and report
+    # (stratified on the last column: the main target, or in-hospital death)
+    rows = np.arange(n)
+    if retire == 'weakest':
+        rank_rows, eval_rows = train_test_split(rows, test_size=eval_fraction, stratify=Y[:, -1], random_state=version)
+    else:
+        rank_rows, eval_rows = rows[:0], rows
+
+    pos = [list(c).index(1) for c in classes]
+    proba = np.stack([_tree_proba(tree, Xt, pos) for tree in forest.estimators_])
+
+    # Scoring each tree by its out-of-bag Brier score on the ranking rows (lower is better)
+    squared = ((proba[:, rank_rows] - Y[rank_rows]) ** 2).mean(axis=2)
+    errors = np.where(oob[:, rank_rows], squared, 0.0).sum(axis=1)
+    counts = oob[:, rank_rows].sum(axis=1)
+    brier = np.divide(errors, counts, out=np.full(len(counts), np.nan), where=counts > 0)
+
+    # Retiring trees until the forest is back to max_trees
+    n_drop = max(len(forest.estimators_) - max_trees, 0)
+    if retire == 'oldest':
+        drop = np.argsort(batches, kind='stable')[:n_drop]
+    else:
+        # Trees with no out-of-bag ranking rows have no score and are retired first
+        drop = np.argsort(-np.nan_to_num(brier, nan=np.inf), kind='stable')[:n_drop]
+    keep = np.setdiff1d(np.arange(len(forest.estimators_)), drop)
+
+    forest.estimators_ = [forest.estimators_[i] for i in keep]
+    forest.n_estimators = len(keep)
+    batches = [batches[i] for i in keep]
+
+    # Out-of-bag prediction for each evaluation patient from the kept trees that did not see it
+    oob_kept = oob[np.ix_(keep, eval_rows)]
+    oob_proba = (proba[np.ix_(keep, eval_rows)] * oob_kept[:, :, None]).sum(axis=0)
+    oob_proba /= np.maximum(oob_kept.sum(axis=0), 1)[:, None]
+    if horizons is not None:
+        # Horizons are nested, so risk can only grow from ED to in-hospital (as in predict_horizons)
+        oob_proba = np.maximum.accumulate(oob_proba, axis=1)
+    Y_eval = Y[eval_rows]
+    thresholds = [threshold_for_recall(Y_eval[:, k], oob_proba[:, k], target_recall) for k in range(Y.shape[1])]
+
+    # The last column is the result the app reports (the main target or in-hospital death);
+    # the previous package never saw the recent patients, so its predictions are out-of-sample
+    threshold = thresholds[-1]
+    previous_proba, previous_threshold, _ = predict_mortality(package, X)
+    previous_metrics = evaluate(Y_eval[:, -1], previous_proba[eval_rows], previous_threshold)
+    metrics = evaluate(Y_eval[:, -1], oob_proba[:, -1], threshold)
+
+    new_package = dict(package)
+    if horizons is not None:
+        new_package['horizons'] = dict(
+            horizons,
+            model=model,
+            thresholds=dict(zip(names, thresholds)),
+            metrics=metrics,
+            tree_batches=batches
+        )
+    else:
+        new_package.update({'model': model, 'threshold': threshold, 'metrics': metrics, 'tree_batches': batches})
+    new_package.update({
+        'version': version + 1,
+        'parent_version': version,
+        'updated_on': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    })
+
+    report = {
+        'previous_version': version,
+        'version': version + 1,
+        'updated_model': 'horizons' if horizons is not None else 'model',
+        'n_recent': n,
+        'n_eval': len(eval_rows),
+        'n_new_trees': n_new_trees,
+        'n_retired': int(n_drop),
+        'n_retired_new': int(np.sum(np.asarray(drop) >= n_old)),
+        'retire': retire,
+        'n_trees': len(keep),
+        'previous': dict(previous_metrics, threshold=float(previous_threshold)),
+        'updated': dict(metrics, threshold=threshold)
+    }
+    if horizons is not None:
+        report['previous']['thresholds'] = {k: float(v) for k, v in horizons['thresholds'].items()}
+        report['updated']['thresholds'] = dict(zip(names, thresholds))
+    return new_package, report
+
+
+def save_package(package, report, out_dir='model_versions'):
+    """Writes the versioned package and its comparison report; returns both paths."""
+    os.makedirs(out_dir, exist_ok=True)
+    version = package['version']
+    package_path = os.path.join(out_dir, f"rf_mortality_model_v{version}.pickle")
+    report_path = os.path.join(out_dir, f"comparison_v{version}.json")
+
+    with open(package_path, 'wb') as f:
+        pickle.dump(package, f)
+    with open(report_path, 'w') as f:
+        json.dump(report, f, indent=2, default=float)
+    return package_path, report_path
@@ -0,0 +1,191 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed, effective_n_jobs
+from scipy import sparse
+
+# Grid axes at the 'Test the model' widget ranges and step sizes
+LACTATE_GRID = np.round(np.arange(0.2, 15.0 + 0.05, 0.1), 1)
+UREA_GRID = np.round(np.arange(2.0, 450.0 + 0.5, 1.0), 1)
+
+
+def _node_proba(tree, pos):
+    # Death probability at every node, one row per output, normalised as in predict_proba
+    value = tree.tree_.value
+    n_classes = np.atleast_1d(tree.n_classes_)
+    out = np.empty((len(pos), value.shape[0]))
+    for k, p in enumerate(pos):
+        total = value[:, k, :n_classes[k]].sum(axis=1)
+        total[total == 0] = 1.0
+        out[k] = value[:, k, p] / total
+    return out
+
+
+def _leaf_dtype(tree):
+    # Leaves are kept for every grid point and tree, so the smallest index type is used
+    return np.uint16 if tree.tree_.node_count <= np.iinfo(np.uint16).max else np.int32
+
+
+def _score_trees(trees, node_proba, X):
+    # Leaf of every grid point in each tree of a chunk, plus the chunk's summed probabilities
+    leaves, total = [], np.zeros((node_proba[0].shape[0], X.shape[0]))
+    for tree, proba in zip(trees, node_proba):
+        leaf = tree.apply(X, check_input=False)
+        total += proba.take(leaf, axis=1)
+        leaves.append(leaf.astype(_leaf_dtype(tree)))
+    return leaves, total
+
+
+def _update_trees(trees, node_proba, leaves, on_path, X):
+    # Re-traversing only the grid points whose path crosses a flipped split; leaves are updated in place
+    delta = np.zeros((node_proba[0].shape[0], X.shape[0]))
+    for tree, proba, leaf, flipped in zip(trees, node_proba, leaves, on_path):
+        old = leaf.astype(np.intp)
+        moved = flipped.take(old)
+        if not moved.any():
+            continue
+        if moved.mean() > 0.5:
+            # Most points affected: one full traversal is cheaper than gathering the rows
+            new = tree.apply(X, check_input=False)
+            delta += proba.take(new, axis=1) - proba.take(old, axis=1)
+            leaf[:] = new
+        else:
+            rows = np.flatnonzero(moved)
+            new = tree.apply(X[rows], check_input=False)
+            delta[:, rows] += proba.take(new, axis=1) - proba.take(old[rows], axis=1)
+            leaf[rows] = new
+    return delta
+
+
+class RiskSurface:
+    """Risk over a two-input grid (lactate x urea by default) with the other inputs fixed.
+
+    The risk is the one the page reports: the horizon model's 'In-hospital' output when
+    the package has one, otherwise the main model. The grid is scored in one batch and
+    the leaf of every grid point in every tree is kept. When fixed inputs change, a point
+    can only move if its path crosses a split on a changed column that sends the old and
+    new values different ways, so only those points are re-traversed. Finished surfaces
+    are cached per fixed-input tuple.
+    """
+
+    def __init__(self, package, x_col='Lactate (in ABG)', x_values=LACTATE_GRID,
+                 y_col='Urea (mg/dl)', y_values=UREA_GRID, max_cached=32, n_jobs=-1):
+        self.package = package
+        self.version = package.get('version', 1)
+        self.x_col, self.x_values = x_col, np.asarray(x_values)
+        self.y_col, self.y_values = y_col, np.asarray(y_values)
+        self.max_cached = max_cached
+        self.n_jobs = n_jobs
+
+        if "horizons" in package:
+            model = package['horizons']['model']
+            self.threshold = package['horizons']['thresholds']['In-hospital']
+        else:
+            model = package['model']
+            self.threshold = package['threshold']
+        self.preprocessor = model[:-1]
+        self.forest = model.steps[-1][1]
+        classes = self.forest.classes_ if self.forest.n_outputs_ > 1 else [self.forest.classes_]
+        self.pos = [list(c).index(1) for c in classes]
+        self.trees = self.forest.estimators_
+        self.node_proba = [_node_proba(tree, self.pos) for tree in self.trees]
+
+        # Nodes of all trees laid end to end with their parents, so flips are found in a few array operations
+        self._offsets = np.cumsum([0] + [tree.tree_.node_count for tree in self.trees])
+        self._feature = np.concatenate([tree.tree_.feature for tree in self.trees])
+        self._split = np.concatenate([tree.tree_.threshold for tree in self.trees])
+        self._parent = np.full(self._offsets[-1], -1)
+        for tree, start in zip(self.trees, self._offsets):
+            for children in (tree.tree_.children_left, tree.tree_.children_right):
+                inner = np.flatnonzero(children >= 0)
+                self._parent[start + children[inner]] = start + inner
+
+        # Non-root nodes grouped by depth, to propagate flips from the roots down
+        self._levels = []
+        level = np.flatnonzero(self._parent < 0)
+        while len(level):
+            level = np.flatnonzero(np.isin(self._parent, level))
+            if len(level):
+                self._levels.append(level)
+
+        self._cache = OrderedDict()
+        self._last = None
+        self._lock = threading.Lock()
+
+    def _grid_frame(self, fixed):
+        # One row per grid point: x varies fastest, y along the rows of the surface
+        xx, yy = np.meshgrid(self.x_values, self.y_values)
+        grid = pd.DataFrame({col: np.repeat(value, xx.size) for col, value in fixed.items()})
+        grid[self.x_col] = xx.ravel()
+        grid[self.y_col] = yy.ravel()
+        grid = grid[self.package['features']]
+
+        numeric = grid.columns.drop('Resuscitation Received', errors='ignore')
+        grid[numeric] = grid[numeric].astype(float)
+        if "imputer" in self.package:
+            grid = self.package["imputer"].transform(grid)
+        return grid
+
+    def _transform(self, grid):
+        Xt = self.preprocessor.transform(grid)
+        if sparse.issparse(Xt):
+            Xt = Xt.toarray()
+        return np.ascontiguousarray(Xt, dtype=np.float32)
+
+    def _chunks(self):
+        # One contiguous block of trees per worker
+        size = max(-(-len(self.trees) // effective_n_jobs(self.n_jobs)), 1)
+        return [slice(i, i + size) for i in range(0, len(self.trees), size)]
+
+    def _flipped_paths(self, old, new):
+        # Per tree, the nodes whose path from the root crosses a split that sends old and new different ways
+        flipped = np.zeros(len(self._feature), dtype=bool)
+        for f in np.flatnonzero(np.any(old != new, axis=0)):
+            nodes = self._feature == f
+            a, b = old[0, f], new[0, f]
+            if (old[:, f] == a).all() and (new[:, f] == b).all():
+                # Column constant over the grid (a fixed input): only splits between the two values flip
+                nodes &= (a <= self._split) != (b <= self._split)
+            flipped |= nodes
+
+        on_path = np.zeros(len(flipped), dtype=bool)
+        for level in self._levels:
+            parent = self._parent[level]
+            on_path[level] = on_path[parent] | flipped[parent]
+        return [on_path[start:stop] for start, stop in zip(self._offsets[:-1], self._offsets[1:])]
+
+    def compute(self, fixed):
+        """Returns the surface (len(y_values) x len(x_values)) for the given fixed inputs."""
+        key = tuple(sorted((col, None if pd.isna(v) else v) for col, v in fixed.items()))
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+
+            Xt = self._transform(self._grid_frame(fixed))
+            with Parallel(n_jobs=self.n_jobs, prefer='threads') as parallel:
+                if self._last is None:
+                    results = parallel(
+                        delayed(_score_trees)(self.trees[s], self.node_proba[s], Xt) for s in self._chunks()
+                    )
+                    leaves = [leaf for chunk, _ in results for leaf in chunk]
+                    sums = sum(total for _, total in results)
+                else:
+                    # Only the points that change leaf are re-traversed (leaves are updated in place)
+                    last_Xt, leaves, sums = self._last
+                    on_path = self._flipped_paths(last_Xt, Xt)
+                    sums = sums + sum(parallel(
+                        delayed(_update_trees)(self.trees[s], self.node_proba[s], leaves[s], on_path[s], Xt)
+                        for s in self._chunks()
+                    ))
+            self._last = (Xt, leaves, sums)
+
+            # Horizons are nested, so the in-hospital risk is the running maximum (as in predict_horizons)
+            proba = np.maximum.accumulate(sums / len(self.trees), axis=0)[-1]
+            surface = proba.reshape(len(self.y_values), len(self.x_values))
+            self._cache[key] = surface
+            if len(self._cache) > self.max_cached:
+                self._cache.popitem(last=False)
+            return surface
@@ -0,0 +1,353 @@
+import numpy as np
+import pandas as pd
+from scipy import stats
+from scipy.special import ndtr, ndtri
+
+from imputation import NUMERIC_COLUMNS
+
+# Interventions that make up 'Resuscitation Received' (same order as the app's multiselect)
+RESUSCITATION_OPTIONS = [
+    "Fluid",
+    "Use of Vasopressors",
+    "Use of Invasive Ventilation",
+    "Use of Non-Invasive Ventilation",
+    "CPR"
+]
+
+# Outcome categories ordered by severity so the latent variable is meaningful
+MORTALITY_ORDER = [
+    'Alive',
+    'Left Against Medical Advice',
+    'In-Hospital Mortality (>7 Days)',
+    'Within 7 Days Mortality',
+    'Ed Mortality'
+]
+
+_NO_VALUE = {"", "nan", "none", "null"}
+
+
+def _normal_scores(values):
+    # Rank-based normal scores (mid-ranks for ties); NaN stays NaN
+    values = pd.Series(values)
+    ranks = values.rank(method='average')
+    return ndtri(ranks / (values.notna().sum() + 1)).to_numpy()
+
+
+def _nearest_correlation(corr, eps=1e-6, max_iter=200, tol=1e-8):
+    # Higham (2002) alternating projections with Dykstra's correction: the nearest matrix
+    # with eigenvalues >= eps and a unit diagonal, so consistent pairs keep their correlation
+    corr = np.nan_to_num((corr + corr.T) / 2)
+    np.fill_diagonal(corr, 1.0)
+    Y, correction = corr, np.zeros_like(corr)
+    for _ in range(max_iter):
+        R = Y - correction
+        w, V = np.linalg.eigh(R)
+        X = (V * np.maximum(w, eps)) @ V.T
+        correction = X - R
+        Y_next = X.copy()
+        np.fill_diagonal(Y_next, 1.0)
+        done = np.linalg.norm(Y_next - Y) <= tol * np.linalg.norm(Y)
+        Y = Y_next
+        if done:
+            break
+    # Restoring symmetry and the diagonal exactly (the change is at the level of tol)
+    Y = (Y + Y.T) / 2
+    d = np.sqrt(np.diag(Y))
+    return Y / np.outer(d, d)
+
+
+def _em_correlation(S, corr, zero_pairs=(), max_iter=100, tol=1e-4):
+    # Gaussian EM on the normal scores (NaN where missing), started from corr. Every pair is
+    # estimated jointly with the others, so the result is a valid matrix that keeps strong pairs
+    # (pairwise-complete estimates use different rows and need not be consistent with each other).
+    # zero_pairs are held at zero: a value is never seen with its own "is missing" latent, so the
+    # data do not identify that pair and EM would otherwise let it drift
+    zero = np.zeros(corr.shape, dtype=bool)
+    for a, b in zero_pairs:
+        zero[a, b] = zero[b, a] = True
+    # Constant latents (single-level categories) carry no information and would make cov singular
+    scale = np.nanstd(S, axis=0)
+    varying = np.flatnonzero(scale > 0)
+    S, scale, zero = S[:, varying], scale[varying], zero[np.ix_(varying, varying)]
+    missing = np.isnan(S)
+    if not missing.any():
+        return corr
+
+    patterns, inverse = np.unique(missing, axis=0, return_inverse=True)
+    groups = [np.flatnonzero(inverse.ravel() == k) for k in range(len(patterns))]
+    mean, cov = np.nanmean(S, axis=0), corr[np.ix_(varying, varying)] * np.outer(scale, scale)
+    for _ in range(max_iter):
+        filled, correction = np.where(missing, 0.0, S), np.zeros_like(cov)
+        precision = np.linalg.inv(cov)
+        for pattern, rows in zip(patterns, groups):
+            m, o = np.flatnonzero(pattern), np.flatnonzero(~pattern)
+            if not len(m):
+                continue
+            # Conditional mean and covariance of the missing scores given the observed ones, from the
+            # precision matrix so only the (small) missing block is inverted
+            cond_cov = np.linalg.inv(precision[np.ix_(m, m)])
+            coef = -cond_cov @ precision[np.ix_(m, o)]
+            filled[np.ix_(rows, m)] = mean[m] + (S[np.ix_(rows, o)] - mean[o]) @ coef.T
+            correction[np.ix_(m, m)] += len(rows) * cond_cov
+        mean = filled.mean(axis=0)
+        centred = filled - mean
+        cov_next = (centred.T @ centred + correction) / len(S)
+        cov_next[zero] = 0.0
+        # The covariance is only rescaled to a correlation at the end: rescaling every step
+        # no longer matches the scores' own variance and lets the estimate drift
+        d, d_next = np.sqrt(np.diag(cov)), np.sqrt(np.diag(cov_next))
+        done = np.max(np.abs(cov_next / np.outer(d_next, d_next) - cov / np.outer(d, d))) < tol
+        cov = cov_next
+        if done:
+            break
+    d = np.sqrt(np.diag(cov))
+    corr = corr.copy()
+    corr[np.ix_(varying, varying)] = cov / np.outer(d, d)
+    return corr
+
+
+def split_resuscitation(value):
+    """Returns the set of interventions listed in a 'Resuscitation Received' entry."""
+    if value is None or str(value).strip().lower() in _NO_VALUE:
+        return set()
+    return {part.strip() for part in str(value).split(',') if part.strip().lower() not in _NO_VALUE}
+
+
+def canonical_resuscitation(value):
+    """Writes a 'Resuscitation Received' entry in the app's format: interventions in a fixed order, or 'None'."""
+    interventions = split_resuscitation(value)
+    ordered = [o for o in RESUSCITATION_OPTIONS if o in interventions] + sorted(interventions - set(RESUSCITATION_OPTIONS))
+    return ", ".join(ordered) or "None"
+
+
+class GaussianCopulaSynthesizer:
+    """Compact Gaussian-copula model of the cleaned ED dataset for synthetic cohorts.
+
+    Every variable gets one latent standard-normal coordinate and the latents share a
+    single correlation matrix, estimated jointly (EM) from rank-based normal scores:
+
+    - continuous labs and vitals: empirical quantile table, plus a second latent for
+      "is missing" so missingness can depend on other values and other missingness;
+    - low-cardinality numeric columns (e.g. Gender) and categorical columns: ordered
+      categories cut from the latent, with missing as its own category;
+    - 'Resuscitation Received': the observed intervention combinations as one
+      category ordered by intensity, so only combinations seen in the data appear.
+
+    Sampling is a matrix product and a few vectorised lookups per chunk.
+    """
+
+    def __init__(self, numeric_columns=None, categorical_columns=('Mortality',),
+                 resuscitation_column='Resuscitation Received', n_quantiles=256,
+                 max_discrete_levels=10, category_orders=None):
+        self.numeric_columns = numeric_columns
+        self.categorical_columns = categorical_columns
+        self.resuscitation_column = resuscitation_column
+        self.n_quantiles = n_quantiles
+        self.max_discrete_levels = max_discrete_levels
+        self.category_orders = category_orders
+
+    def fit(self, df):
+        numeric = [c for c in (self.numeric_columns or NUMERIC_COLUMNS) if c in df.columns]
+        orders = {'Mortality': MORTALITY_ORDER, **(self.category_orders or {})}
+        levels = np.linspace(0, 1, self.n_quantiles)
+
+        self.columns_ = []
+        self.continuous_ = {}
+        self.categorical_ = {}
+        scores = []
+
+        for col in numeric:
+            values = pd.to_numeric(df[col], errors='coerce')
+            observed = values.dropna()
+            if observed.nunique() <= self.max_discrete_levels:
+                self._add_categorical(col, values, sorted(observed.unique()), scores)
+                continue
+
+            # Quantile table for the marginal and a rounding flag for integer-valued columns
+            entry = {
+                'latent': len(scores),
+                'quantiles': np.quantile(observed, levels),
+                'integer': bool(np.all(observed == np.round(observed))),
+                'missing_latent': None
+            }
+            scores.append(_normal_scores(values))
+            missing = values.isna()
+            if 0 < missing.mean() < 1:
+                entry['missing_latent'] = len(scores)
+                entry['missing_cut'] = ndtri(missing.mean())
+                scores.append(-_normal_scores(missing.astype(int)))
+            self.continuous_[col] = entry
+            self.columns_.append(col)
+
+        for col in self.categorical_columns or ():
+            if col not in df.columns:
+                continue
+            values = df[col].astype(str).str.strip()
+            observed = [v for v in pd.unique(values)]
+            order = [v for v in orders.get(col, []) if v in observed]
+            order += sorted(v for v in observed if v not in order)
+            self._add_categorical(col, values, order, scores)
+
+        # Resuscitation combinations as one categorical, ordered by intensity (number of interventions)
+        if self.resuscitation_column and self.resuscitation_column in df.columns:
+            combos = df[self.resuscitation_column].map(canonical_resuscitation)
+            order = sorted(pd.unique(combos), key=lambda c: (len(split_resuscitation(c)), c))
+            self._add_categorical(self.resuscitation_column, combos, order, scores)
+
+        # Pairwise-complete correlation of the normal scores, repaired to a valid matrix, as the
+        # start of a joint (EM) estimate; the last projection only guards the Cholesky factor
+        S = np.column_stack(scores)
+        start = _nearest_correlation(pd.DataFrame(S).corr().to_numpy())
+        own = [
+            (e['latent'], e['missing_latent']) for e in self.continuous_.values() if e['missing_latent'] is not None
+        ]
+        self.correlation_ = _nearest_correlation(_em_correlation(S, start, own))
+        self.cholesky_ = np.linalg.cholesky(self.correlation_).astype(np.float32)
+        return self
+
+    def _add_categorical(self, col, values, order, scores):
+        # Ordered categories (missing first) cut from one latent coordinate
+        codes = pd.Categorical(values, categories=order).codes.astype(float)  # -1 = missing
+        counts = np.bincount(codes.astype(int) + 1, minlength=len(order) + 1)
+        if counts[0] == 0:
+            categories, counts = list(order), counts[1:]
+        else:
+            categories = [np.nan] + list(order)
+            codes = codes + 1
+        self.categorical_[col] = {
+            'latent': len(scores),
+            'categories': categories,
+            'cuts': ndtri(np.cumsum(counts)[:-1] / counts.sum())
+        }
+        scores.append(_normal_scores(codes))
+        self.columns_.append(col)
+
+    def _sample(self, rng, n):
+        # One row per latent variable, so every column below is a contiguous slice
+        Z = self.cholesky_ @ rng.standard_normal((self.cholesky_.shape[0], n), dtype=np.float32)
+        out = {}
+
+        for col in self.columns_:
+            if col in self.continuous_:
+                entry = self.continuous_[col]
+                # Linear interpolation in the evenly spaced quantile table
+                position = ndtr(Z[entry['latent']]) * (self.n_quantiles - 1)
+                index = np.minimum(position.astype(np.int32), self.n_quantiles - 2)
+                q = entry['quantiles']
+                values = q[index] + (position - index) * (q[index + 1] - q[index])
+                if entry['integer']:
+                    values = np.round(values)
+                if entry['missing_latent'] is not None:
+                    values[Z[entry['missing_latent']] < entry['missing_cut']] = np.nan
+                out[col] = values
+            else:
+                entry = self.categorical_[col]
+                codes = np.searchsorted(entry['cuts'], Z[entry['latent']])
+                categories = entry['categories']
+                if all(isinstance(c, (int, float, np.number)) for c in categories):
+                    out[col] = np.asarray(categories, dtype=float)[codes]
+                else:
+                    out[col] = pd.Categorical.from_codes(codes, categories=categories)
+
+        return pd.DataFrame(out)
+
+    def iter_chunks(self, n_rows, chunk_size=1_000_000, seed=0):
+        """Yields synthetic rows in chunks; chunk i depends only on (seed, i), so output is reproducible."""
+        n_chunks = -(-n_rows // chunk_size)
+        for i, child in enumerate(np.random.SeedSequence(seed).spawn(n_chunks)):
+            size = min(chunk_size, n_rows - i * chunk_size)
+            yield self._sample(np.random.default_rng(child), size)
+
+    def sample(self, n_rows, seed=0, chunk_size=1_000_000):
+        """Returns n_rows synthetic patients as one DataFrame."""
+        return pd.concat(self.iter_chunks(n_rows, chunk_size, seed), ignore_index=True)
+
+    def to_parquet(self, path, n_rows, chunk_size=1_000_000, seed=0):
+        """Streams n_rows synthetic patients to a Parquet file, one row group per chunk."""
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise ImportError("Writing Parquet requires pyarrow (pip install pyarrow)") from e
+
+        writer = None
+        try:
+            for chunk in self.iter_chunks(n_rows, chunk_size, seed):
+                table = pa.Table.from_pandas(chunk, preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(path, table.schema)
+                writer.write_table(table)
+        finally:
+            if writer is not None:
+                writer.close()
+        return path
+
+
+def fidelity_report(real, synthetic, columns=None, max_rows=200_000, seed=0, attenuation_z=3.0,
+                    attenuation_tol=0.02):
+    """Compares synthetic rows with the source data.
+
+    Returns a dict of DataFrames: 'marginals' (numeric mean/std/median, missing rate and
+    KS statistic), 'categorical' (total variation distance per column) and 'correlation'
+    (Spearman correlation of every numeric pair in both datasets). A pair is flagged as
+    'attenuated' when its synthetic correlation is weaker than the real one by more than
+    attenuation_tol and by more than attenuation_z standard errors on the Fisher z scale
+    (n_real rows have both values), so a strong pair such as urea ~ creatinine shrinking
+    from 0.998 to 0.94 is caught while sampling noise in moderate pairs is not.
+    """
+    if len(synthetic) > max_rows:
+        synthetic = synthetic.sample(max_rows, random_state=seed)
+    columns = [c for c in (columns or synthetic.columns) if c in real.columns]
+
+    numeric, marginals, categorical = [], [], []
+    for col in columns:
+        if pd.api.types.is_numeric_dtype(synthetic[col]):
+            r = pd.to_numeric(real[col], errors='coerce')
+            s = synthetic[col]
+            numeric.append(col)
+            marginals.append({
+                'column': col,
+                'real_mean': r.mean(), 'synthetic_mean': s.mean(),
+                'real_std': r.std(), 'synthetic_std': s.std(),
+                'real_median': r.median(), 'synthetic_median': s.median(),
+                'real_missing': r.isna().mean(), 'synthetic_missing': s.isna().mean(),
+                'ks_statistic': stats.ks_2samp(r.dropna(), s.dropna()).statistic if r.notna().any() and s.notna().any() else np.nan
+            })
+        else:
+            # Written the same way as fit() writes them, so only real differences count
+            if col == 'Resuscitation Received':
+                r = real[col].map(canonical_resuscitation)
+            else:
+                r = real[col].astype(str).str.strip()
+            r = r.value_counts(normalize=True)
+            s = synthetic[col].astype(str).value_counts(normalize=True)
+            r, s = r.align(s, fill_value=0.0)
+            categorical.append({'column': col, 'total_variation': 0.5 * np.abs(r - s).sum(), 'n_categories': len(r)})
+
+    # Pairwise Spearman correlations side by side
+    real_numeric = real[numeric].apply(pd.to_numeric, errors='coerce')
+    real_corr = real_numeric.corr(method='spearman')
+    synth_corr = synthetic[numeric].corr(method='spearman')
+    observed = real_numeric.notna().astype(int)
+    n_pairs = observed.T @ observed
+    pairs = []
+    for i, a in enumerate(numeric):
+        for b in numeric[i + 1:]:
+            pairs.append({
+                'pair': f"{a} ~ {b}", 'real': real_corr.loc[a, b], 'synthetic': synth_corr.loc[a, b],
+                'n_real': n_pairs.loc[a, b]
+            })
+    correlation = pd.DataFrame(pairs, columns=['pair', 'real', 'synthetic', 'n_real'])
+    correlation['difference'] = correlation['synthetic'] - correlation['real']
+
+    # Shrinkage towards zero in standard errors of the real estimate (the synthetic one has many more rows)
+    fisher = [np.arctanh(np.abs(correlation[c].astype(float).clip(-0.9999, 0.9999))) for c in ('real', 'synthetic')]
+    shrinkage = (fisher[0] - fisher[1]) * np.sqrt(np.maximum(correlation['n_real'] - 3, 0))
+    weaker = correlation['real'].abs() - correlation['synthetic'].abs()
+    correlation['attenuated'] = (shrinkage > attenuation_z) & (weaker > attenuation_tol)
+
+    return {
+        'marginals': pd.DataFrame(marginals),
+        'categorical': pd.DataFrame(categorical),
+        'correlation': correlation
+    }
@@ -0,0 +1,174 @@
+import hashlib
+import json
+import os
+import re
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from joblib import effective_n_jobs
+from scipy import sparse
+from sklearn.base import BaseEstimator, TransformerMixin
+from sklearn.feature_extraction import FeatureHasher
+
+# Free-text ED fields and the short prefix that keeps their tokens apart
+TEXT_COLUMNS = {
+    "Chief Complain": "cc",
+    "Provisional Diagnosis at ER": "dx",
+    "Comorbidities": "cm",
+    "Treatment Received at ER": "tx",
+}
+
+# Default size of the hashed feature space (no vocabulary is stored)
+N_FEATURES = 2 ** 18
+
+# Values left behind by the notebook's cleaning steps ('nan' comes from astype(str))
+MISSING_TEXT = {"", "nan", "none", "null", "na", "n/a", "-"}
+
+# Common clinical shorthand that would otherwise be split on the slash
+ABBREVIATIONS = {
+    "k/c/o": "kco",
+    "c/o": "co",
+    "h/o": "ho",
+    "s/p": "sp",
+    "n/v": "nausea vomiting",
+}
+
+STOPWORDS = {"a", "an", "the", "of", "with", "and", "or", "on", "in", "at", "to", "for", "by", "since"}
+
+_ABBREVIATION_RE = re.compile(
+    r"(?<![a-z0-9])(" + "|".join(re.escape(short) for short in ABBREVIATIONS) + r")(?![a-z0-9])"
+)
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:\.[0-9]+)?")
+_PHRASE_RE = re.compile(r"[,;+&\n/]")
+
+
+def clinical_tokens(text, prefix):
+    """Returns field-prefixed unigrams, bigrams and whole phrases for one free-text value."""
+    if text is None:
+        return []
+    text = str(text).strip().lower()
+    if text in MISSING_TEXT:
+        return []
+
+    # Expanding shorthand only where it stands alone, not inside words such as 'pain/vomiting'
+    text = _ABBREVIATION_RE.sub(lambda m: ABBREVIATIONS[m.group(1)], text)
+
+    tokens = []
+    # Comma/semicolon separated entries are treated as separate clinical phrases
+    for phrase in _PHRASE_RE.split(text):
+        words = [w for w in _TOKEN_RE.findall(phrase) if w not in STOPWORDS]
+        if not words:
+            continue
+        tokens.extend(f"{prefix}:{w}" for w in words)
+        tokens.extend(f"{prefix}:{a}_{b}" for a, b in zip(words, words[1:]))
+        if len(words) > 2:
+            tokens.append(f"{prefix}={' '.join(words)}")
+    return tokens
+
+
+def _row_tokens(df):
+    # Building one token list per row across all text columns
+    prefixes = [TEXT_COLUMNS.get(col, str(col)) for col in df.columns]
+    for row in df.itertuples(index=False, name=None):
+        tokens = []
+        for prefix, value in zip(prefixes, row):
+            tokens.extend(clinical_tokens(value, prefix))
+        yield tokens
+
+
+def hash_text_frame(df, n_features=N_FEATURES):
+    """Hashes the text columns of a DataFrame into a sparse CSR count matrix."""
+    hasher = FeatureHasher(
+        n_features=n_features,
+        input_type="string",
+        alternate_sign=False,
+        dtype=np.float32,
+    )
+    return hasher.transform(_row_tokens(df)).tocsr()
+
+
+def iter_hashed_chunks(chunks, n_features=N_FEATURES, n_jobs=None):
+    """Hashes an iterable of DataFrame chunks in worker processes, yielding CSR blocks in order."""
+    # None or -1 means all cores, as elsewhere in the project
+    n_jobs = effective_n_jobs(-1 if n_jobs is None else n_jobs)
+    if n_jobs == 1:
+        for chunk in chunks:
+            yield hash_text_frame(chunk, n_features)
+        return
+
+    with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.submit(hash_text_frame, chunk, n_features))
+            # Keeping at most two chunks per worker in flight so memory stays bounded
+            if len(pending) >= 2 * n_jobs:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def _cache_key(path, columns, n_features, chunksize):
+    stat = os.stat(path)
+    key = json.dumps([os.path.abspath(path), stat.st_size, stat.st_mtime_ns, columns, n_features, chunksize])
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+
+
+def featurize_csv(path, cache_dir, columns=None, n_features=N_FEATURES, chunksize=50_000,
+                  n_jobs=None, encoding="latin-1"):
+    """Streams a CSV of ED records through the hasher and caches one .npz part per chunk.
+
+    Returns the list of part files; a second call on the unchanged file reuses the cache.
+    """
+    columns = list(columns or TEXT_COLUMNS)
+    out_dir = os.path.join(cache_dir, _cache_key(path, columns, n_features, chunksize))
+    manifest = os.path.join(out_dir, "manifest.json")
+
+    # Reusing cached parts when the source file and settings are unchanged
+    if os.path.exists(manifest):
+        with open(manifest) as f:
+            return [os.path.join(out_dir, p) for p in json.load(f)["parts"]]
+
+    os.makedirs(out_dir, exist_ok=True)
+    chunks = pd.read_csv(path, usecols=columns, dtype=str, chunksize=chunksize, encoding=encoding)
+
+    parts, n_rows = [], 0
+    for i, block in enumerate(iter_hashed_chunks(chunks, n_features, n_jobs)):
+        name = f"part-{i:05d}.npz"
+        sparse.save_npz(os.path.join(out_dir, name), block)
+        parts.append(name)
+        n_rows += block.shape[0]
+
+    # Writing the manifest last so an interrupted run is never mistaken for a complete one
+    with open(manifest, "w") as f:
+        json.dump({"parts": parts, "rows": n_rows, "columns": columns, "n_features": n_features}, f)
+    return [os.path.join(out_dir, p) for p in parts]
+
+
+def load_text_features(parts):
+    """Stacks cached .npz parts back into a single CSR matrix."""
+    return sparse.vstack([sparse.load_npz(p) for p in parts], format="csr")
+
+
+class ClinicalTextHasher(BaseEstimator, TransformerMixin):
+    """Stateless scikit-learn transformer wrapping hash_text_frame for use in a ColumnTransformer."""
+
+    def __init__(self, n_features=N_FEATURES):
+        self.n_features = n_features
+
+    def fit(self, X, y=None):
+        return self
+
+    def transform(self, X):
+        if not isinstance(X, pd.DataFrame):
+            X = pd.DataFrame(X)
+        return hash_text_frame(X, self.n_features)
+
+    def get_feature_names_out(self, input_features=None):
+        return np.array([f"text_hash_{i}" for i in range(self.n_features)], dtype=object)
+
+
+def text_feature_block(columns=None, n_features=N_FEATURES):
+    """Returns a ColumnTransformer entry that adds the hashed text features to a preprocessor."""
+    return ("text", ClinicalTextHasher(n_features=n_features), list(columns or TEXT_COLUMNS))